@@ -3,6 +3,7 @@ import time
 import numpy as np
 from VMD.MovingCameraForegroundEstimetor.MathematicalModels import CompensationModel, StatisticalModel
 from VMD.MovingCameraForegroundEstimetor.KLTWrapper import KLTWrapper
+from VMD.MovingCameraForegroundEstimetor import utils
 import cv2
 from SoiUtils.interfaces import Resetable, Updatable
 from SoiUtils.output_recorder import global_output_recorder
@@ -15,7 +16,8 @@ class ForegroundEstimetor(Resetable, Updatable):
     """
     def __init__(self, num_models: int = 2, block_size: int = 4, var_init: float = 20.0*20.0, var_trim: float = 5.0*5.0,
                  lam: float = 0.001, theta_v: float = 50.0*50.0, age_trim: float = 30, theta_s=2, theta_d=2,
-                 dynamic=False, calc_probs=False, sensitivity="mixed", suppress=False, smooth=True):
+                 dynamic=False, calc_probs=False, sensitivity="mixed", suppress=False, smooth=True,
+                 static_sad_thresh=0):
         """
         :param num_models: number of models for each pixel to use, minimum possible value is 2
         :param block_size: the size of a square block in the grid the image dims most be able to divide by this param
@@ -34,6 +36,9 @@ class ForegroundEstimetor(Resetable, Updatable):
         False: update then foreground - this is what the paper stats. less sensetive to changes but also to noise
         'mixed': the implementation of the original code. update mean, the foreground, then update vars and ages
         :param smooth: if True smooth frame using gaussian blur
+        :param static_sad_thresh: if the mean absolute difference of an 8 times downsampled frame from the last tracked
+                        frame is below this threshold, the camera is considered static and the tracking is skipped.
+                        0 always tracks
         """
         self.is_first = True
 
@@ -58,6 +63,12 @@ class ForegroundEstimetor(Resetable, Updatable):
         self.calc_probs = calc_probs
         self.sensitivity = sensitivity
         self.smooth = smooth
+        self.static_sad_thresh = static_sad_thresh
+        self.tracked_small_frame = None
+        self.gaussian_kernel = cv2.getGaussianKernel(5, 0)  # separable 1D kernel of the 5x5 smoothing blur
+        # smoothed frames are written to two alternating buffers, the homography calculator keeps the previous one
+        self.blur_buffers = None
+        self.blur_index = 0
 
         self.num_frames = 0
         self.com_time = 0
@@ -69,7 +80,7 @@ class ForegroundEstimetor(Resetable, Updatable):
 
     def update(self, num_models: int, block_size: int, var_init: float, var_trim: float,
                  lam: float, theta_v: float, age_trim: float, theta_s, theta_d,
-                 dynamic, calc_probs, sensitivity, suppress, smooth, **kwargs):
+                 dynamic, calc_probs, sensitivity, suppress, smooth, static_sad_thresh=0, **kwargs):
         self.var_init = var_init
         self.var_trim = var_trim
         self.lam = lam
@@ -83,6 +94,7 @@ class ForegroundEstimetor(Resetable, Updatable):
         self.calc_probs = calc_probs
         self.sensitivity = sensitivity
         self.smooth = smooth
+        self.static_sad_thresh = static_sad_thresh
 
         if self.num_models != num_models or self.block_size != block_size:
             self.num_models = num_models
@@ -104,6 +116,9 @@ class ForegroundEstimetor(Resetable, Updatable):
         self.statistical_models = None
         self.model_height = None
         self.model_width = None
+        self.blur_buffers = None
+        self.blur_index = 0
+        self.tracked_small_frame = None
 
         self.num_frames = 0
         self.com_time = 0
@@ -150,6 +165,39 @@ class ForegroundEstimetor(Resetable, Updatable):
         foreground = self.statistical_models.get_foreground(gray_frame, com_means, com_vars, com_ages)
         return foreground
 
+    def calc_homography(self, gray_frame):
+        """
+        homography between the frame and the previous one, identity without tracking if the frame barely changed since
+        the last tracked frame
+        :param gray_frame: a gray frame
+        :return: homography matrix
+        """
+        if not self.static_sad_thresh:
+            return self.homography_calculator.RunTrack(gray_frame)
+
+        small_frame = cv2.resize(gray_frame, None, fx=1 / 8, fy=1 / 8, interpolation=cv2.INTER_AREA)
+        if self.tracked_small_frame is not None and \
+                cv2.norm(small_frame, self.tracked_small_frame, cv2.NORM_L1) / small_frame.size < self.static_sad_thresh:
+            return np.identity(3, dtype=np.float32)
+
+        self.tracked_small_frame = small_frame
+        # the tracker keeps the frame as the reference of its next tracking, which may be many frames later
+        return self.homography_calculator.RunTrack(gray_frame.copy())
+
+    def smooth_frame(self, gray_frame):
+        """
+        blur the frame into the next scratch buffer
+        :param gray_frame: a gray frame
+        :return: smoothed frame
+        """
+        if self.blur_buffers is None or self.blur_buffers[0].shape != gray_frame.shape:
+            self.blur_buffers = [utils.aligned_empty(gray_frame.shape, gray_frame.dtype) for _ in range(2)]
+        blurred = self.blur_buffers[self.blur_index]
+        self.blur_index = 1 - self.blur_index
+        # gray_frame = cv2.medianBlur(gray_frame, 5)
+        cv2.sepFilter2D(gray_frame, -1, self.gaussian_kernel, self.gaussian_kernel, dst=blurred)
+        return blurred
+
     def get_foreground(self, gray_frame):
         """
         do the full pipeline, calculating foreground
@@ -163,8 +211,7 @@ class ForegroundEstimetor(Resetable, Updatable):
             self.reset()
 
         if self.smooth:
-            # gray_frame = cv2.medianBlur(gray_frame, 5)
-            gray_frame = cv2.GaussianBlur(gray_frame, (5, 5), 0)
+            gray_frame = self.smooth_frame(gray_frame)
 
         if self.is_first:   # if first frame initialize
             x = self.first_pass(gray_frame)
@@ -175,7 +222,7 @@ class ForegroundEstimetor(Resetable, Updatable):
         # compensate
         prev_means, prev_vars, prev_ages = self.statistical_models.get_models()
         s0 = time.time()
-        H = self.homography_calculator.RunTrack(gray_frame)
+        H = self.calc_homography(gray_frame)
         e0 = time.time()
         self.h_time += e0 - s0
 
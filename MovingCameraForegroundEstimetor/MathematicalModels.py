@@ -7,9 +7,10 @@ class BaseModel:
     """
     parent class for the compensation model and the statistics model
     """
-    def __init__(self, num_models, model_height, model_width, block_size, var_init, var_trim):
+    def __init__(self, num_models, model_height, model_width, block_size, var_init, var_trim, dtype=np.float32):
         """
         see foreground model init for documentation
+        :param dtype: floating point type of the models' buffers
         """
         self.prev_means = None
         self.vars = None
@@ -19,8 +20,9 @@ class BaseModel:
         self.model_width = model_width
         self.block_size = block_size
         self.num_models = num_models
-        self.var_init = var_init
-        self.var_trim = var_trim
+        self.dtype = np.dtype(dtype).type
+        self.var_init = self.dtype(var_init)
+        self.var_trim = self.dtype(var_trim)
 
         self.func_time = 0
         self.num_frames = 0
@@ -29,9 +31,9 @@ class BaseModel:
         """
         create zero params of size of the models and the grids
         """
-        self.means = np.zeros((self.num_models, self.model_height, self.model_width), dtype=np.float32)
-        self.vars = np.zeros((self.num_models, self.model_height, self.model_width), dtype=np.float32)
-        self.ages = np.zeros((self.num_models, self.model_height, self.model_width), dtype=np.float32)
+        self.means = np.zeros((self.num_models, self.model_height, self.model_width), dtype=self.dtype)
+        self.vars = np.zeros((self.num_models, self.model_height, self.model_width), dtype=self.dtype)
+        self.ages = np.zeros((self.num_models, self.model_height, self.model_width), dtype=self.dtype)
 
     def get_models(self):
         """
@@ -40,35 +42,48 @@ class BaseModel:
         return self.means, self.vars, self.ages
 
     def update(self, var_init, var_trim):
-        self.var_init = var_init
-        self.var_trim = var_trim
+        self.var_init = self.dtype(var_init)
+        self.var_trim = self.dtype(var_trim)
 
 
 class CompensationModel(BaseModel):
-    def __init__(self, num_models, model_height, model_width, block_size, var_init, var_trim, lam, theta_v):
-        super(CompensationModel, self).__init__(num_models, model_height, model_width, block_size, var_init, var_trim)
-        self.lam = lam
-        self.theta_v = theta_v
+    def __init__(self, num_models, model_height, model_width, block_size, var_init, var_trim, lam, theta_v,
+                 dtype=np.float32):
+        super(CompensationModel, self).__init__(num_models, model_height, model_width, block_size, var_init, var_trim,
+                                                dtype)
+        self.lam = self.dtype(lam)
+        self.theta_v = self.dtype(theta_v)
 
         self.x_grid_coords = None
         self.y_grid_coords = None
         self.points = None
 
+        # scratch buffers reused by every compensation
+        self.W = None
+        self.temp_means = None
+        self.temp_ages = None
+
     def init(self, means, vars, ages):
         super(CompensationModel, self).init()
+        shape = (self.num_models, self.model_height, self.model_width)
+        self.W = utils.aligned_empty(shape, self.dtype)
+        self.temp_means = utils.aligned_empty(shape, self.dtype)
+        self.temp_ages = utils.aligned_empty(shape, self.dtype)
         H = np.identity(3, dtype=np.float32)
         self.get_grid_coords_and_points()
         return self.compensate(H, means, vars, ages)
 
     def update(self, var_init, var_trim, lam, theta_v):
         super(CompensationModel, self).update(var_init, var_trim)
-        self.lam = lam
-        self.theta_v = theta_v
+        self.lam = self.dtype(lam)
+        self.theta_v = self.dtype(theta_v)
 
     def get_grid_coords_and_points(self):
         self.x_grid_coords, self.y_grid_coords = utils.get_grid_coords(self.model_width, self.model_height)
-        self.points = np.asarray([self.x_grid_coords * self.block_size + self.block_size / 2, self.y_grid_coords * self.block_size +
-                             self.block_size / 2, np.ones(len(self.x_grid_coords))], dtype=np.float32)  # current frame grid centers 3D
+        self.points = np.empty((3, len(self.x_grid_coords)), dtype=np.float32)  # current frame grid centers 3D
+        self.points[0] = self.x_grid_coords * self.block_size + self.block_size / 2
+        self.points[1] = self.y_grid_coords * self.block_size + self.block_size / 2
+        self.points[2] = 1
 
     def get_weights_for_directions(self, abs_offset_x, abs_offset_y):
         """
@@ -195,10 +210,10 @@ class CompensationModel(BaseModel):
 
           # the normalized weight of this crop
 
-        W = np.zeros((self.num_models, self.model_height, self.model_width), dtype=np.float32)
-
-        temp_means = np.zeros_like(prev_means)
-        temp_ages = np.zeros_like(prev_means)
+        W, temp_means, temp_ages = self.W, self.temp_means, self.temp_ages
+        W.fill(0)
+        temp_means.fill(0)
+        temp_ages.fill(0)
         W, temp_means, temp_ages, cond_horizontal, cond_vertical, cond_diagonal, cond_self = \
             utils_numba.compensate_mean_and_age(temp_means, temp_ages, prev_means, prev_ages, W, W_H, W_V, W_HV, W_self,
                                              self.x_grid_coords, self.y_grid_coords, prev_x_grid_coords, prev_y_grid_coords,
@@ -239,8 +254,9 @@ class StatisticalModel(BaseModel):
 
     def __init__(self, num_models, model_height, model_width, block_size, var_init, var_trim, age_trim, theta_s,
                  theta_d=4,
-                 dynamic=False, calc_probs=False, sensitivity=False, suppress=False):
-        super(StatisticalModel, self).__init__(num_models, model_height, model_width, block_size, var_init, var_trim)
+                 dynamic=False, calc_probs=False, sensitivity=False, suppress=False, dtype=np.float32):
+        super(StatisticalModel, self).__init__(num_models, model_height, model_width, block_size, var_init, var_trim,
+                                               dtype)
         self.age_trim = age_trim
         self.theta_s = theta_s
         self.theta_d = theta_d
@@ -256,9 +272,9 @@ class StatisticalModel(BaseModel):
     def init(self):
         super(StatisticalModel, self).init()
         self.temporal_property = np.zeros((self.model_height * self.block_size, self.model_width * self.block_size),
-                                          dtype=np.float32)
+                                          dtype=self.dtype)
         self.spatial_property = np.zeros((self.model_height * self.block_size, self.model_width * self.block_size),
-                                         dtype=np.float32)
+                                         dtype=self.dtype)
 
     def update(self, var_init, var_trim, age_trim, theta_s, theta_d, dynamic, calc_probs, sensitivity, suppress):
         super(StatisticalModel, self).update(var_init, var_trim)
@@ -8,11 +8,26 @@ def get_grid_coords(num_grids_x, num_grids_y):
     :param num_grids_y: num of blocks in axis y
     :return: x coords, y coords
     """
-    x_grid_coords = np.array([range(num_grids_x)] * num_grids_y).flatten()  # grid coordinates X
-    y_grid_coords = np.repeat(range(num_grids_y), num_grids_x)  # grid coordinates Y
+    x_grid_coords = np.tile(np.arange(num_grids_x), num_grids_y)  # grid coordinates X
+    y_grid_coords = np.repeat(np.arange(num_grids_y), num_grids_x)  # grid coordinates Y
     return x_grid_coords, y_grid_coords
 
 
+def aligned_empty(shape, dtype, alignment=64):
+    """
+    np.empty whose data starts on an alignment bytes boundary, for buffers reused across frames
+    :param shape: shape of the array
+    :param dtype: dtype of the array
+    :param alignment: alignment in bytes
+    :return: uninitialized aligned array
+    """
+    dtype = np.dtype(dtype)
+    num_bytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.empty(num_bytes + alignment, dtype=np.uint8)
+    offset = -raw.ctypes.data % alignment
+    return raw[offset:offset + num_bytes].view(dtype).reshape(shape)
+
+
 def project(points, H):
     """
     project 3d points using projection matrix
@@ -2,7 +2,7 @@ from numba import prange, jit
 import numpy as np
 
 
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def reshape_to_2d_array_numba(arr: np.ndarray, new_shape: tuple):
     reshaped_array = np.empty(new_shape, dtype=arr.dtype)
 
@@ -16,7 +16,7 @@ def reshape_to_2d_array_numba(arr: np.ndarray, new_shape: tuple):
     return reshaped_array
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def get_weights_for_directions(abs_offset_x: np.ndarray, abs_offset_y: np.ndarray, model_height: int, model_width: int):
     """
     get weight of horizontal offset, vertical offset, and diagonal offset
@@ -29,7 +29,7 @@ def get_weights_for_directions(abs_offset_x: np.ndarray, abs_offset_y: np.ndarra
     return W_H, W_V, W_HV, W_self
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def project(points: np.ndarray, H: np.ndarray):
     """
     project 3d points using projection matrix
@@ -44,7 +44,7 @@ def project(points: np.ndarray, H: np.ndarray):
     return new_x, new_y
 
 
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def project_parallel(points: np.ndarray, H: np.ndarray):
     n_points = points.shape[1]
     projected_points = np.empty((3, n_points), dtype=points.dtype)
@@ -62,7 +62,7 @@ def project_parallel(points: np.ndarray, H: np.ndarray):
     return projected_points[0], projected_points[1]
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def calculate_all_coords(prev_center_x, prev_center_y, block_size):
     prev_x_grid_coords_temp = prev_center_x / block_size
     prev_y_grid_coords_temp = prev_center_y / block_size
@@ -79,7 +79,7 @@ def calculate_all_coords(prev_center_x, prev_center_y, block_size):
     return prev_x_grid_coords, prev_y_grid_coords, offset_x, offset_y, abs_offset_x, abs_offset_y
 
 
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def update_by_condition(cond, temp, prev, W, x_grid_coords, y_grid_coords, grid_overlap_x, grid_overlap_y):
     num_temp_channels = temp.shape[0]
     num_grid_coords = y_grid_coords.shape[0]
@@ -93,7 +93,7 @@ def update_by_condition(cond, temp, prev, W, x_grid_coords, y_grid_coords, grid_
     return temp
 
 
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def update_var_by_condition(cond, temp, prev_vars, prev_means, means, W, x_grid_coords, y_grid_coords, prev_x,
                             prev_y):
     num_temp_channels = temp.shape[0]
@@ -108,7 +108,7 @@ def update_var_by_condition(cond, temp, prev_vars, prev_means, means, W, x_grid_
     return temp
 
 
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def update_W_by_condition(W_sum, W, x_grid_cond, y_grid_cond, cond):
     num_temp_channels = W_sum.shape[0]
     num_grid_coords = x_grid_cond.shape[0]
@@ -119,7 +119,7 @@ def update_W_by_condition(W_sum, W, x_grid_cond, y_grid_cond, cond):
     return W_sum
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def compensate_mean_and_age(temp_means, temp_ages, prev_means, prev_ages, W, W_H, W_V, W_HV, W_self,
                             x_grid_coords, y_grid_coords, prev_grid_coords_x, prev_grid_coords_y, offset_x,
                             offset_y, model_height, model_width):
@@ -196,7 +196,7 @@ def compensate_mean_and_age(temp_means, temp_ages, prev_means, prev_ages, W, W_H
     return W, temp_means, temp_ages, cond_horizontal, cond_vertical, cond_diagonal, cond_self
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def compensate_var(prev_vars, prev_means, means, W_H, W_V, W_HV, W_self, x_grid_coords, y_grid_coords,
                    prev_grid_coords_x, prev_grid_coords_y, offset_x, offset_y, cond_horizontal, cond_vertical,
                    cond_diagonal, cond_self):
@@ -224,7 +224,7 @@ def compensate_var(prev_vars, prev_means, means, W_H, W_V, W_HV, W_self, x_grid_
     return temp_var
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def enlarge_pixels(input_array, b_size):
     rows = input_array.shape[0]
     cols = input_array.shape[1]
@@ -237,7 +237,7 @@ def enlarge_pixels(input_array, b_size):
     return enlarged_array
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def convolve2d_with_padding(image, kernel):
     output = np.zeros_like(image)
     kernel_height, kernel_width = kernel.shape
@@ -257,7 +257,7 @@ def convolve2d_with_padding(image, kernel):
     return output
 
 
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def get_chosen_means(means, model_index, jj, ii):
     model_index = model_index.flatten()
     num_elements = len(model_index)
@@ -267,7 +267,7 @@ def get_chosen_means(means, model_index, jj, ii):
     return mns
 
 
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def rebinMean(arr, factor):
     new_shape = (arr.shape[0] // factor[0], factor[0], arr.shape[1] // factor[1], factor[1])
     res = np.empty((new_shape[0], new_shape[2]), dtype=np.float32)
@@ -282,7 +282,7 @@ def rebinMean(arr, factor):
     return res
 
 
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def update_vars_numba(means, ages, com_vars, alpha, gray_image: np.ndarray, models_to_update, model_index, h, w,
                       block_size, var_init, var_trim):
     jj, ii = np.arange(h * w) // w, np.arange(h * w) % w
@@ -302,7 +302,7 @@ def update_vars_numba(means, ages, com_vars, alpha, gray_image: np.ndarray, mode
     return vars
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def update_means(com_means, alpha, cur_mean):
     """
     update the means according to eq (1)
@@ -315,7 +315,7 @@ def update_means(com_means, alpha, cur_mean):
     return means
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def calc_probability(gray, det, temporal_property, spatial_property):
     neighborhood_size = (5, 5)
     kernel = np.ones(neighborhood_size) / (neighborhood_size[0] * neighborhood_size[1])
@@ -329,7 +329,7 @@ def calc_probability(gray, det, temporal_property, spatial_property):
     return out
 
 
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def suppression(gray, out, theta_d, big_mean, big_var):
     sqrt_theta_d = np.sqrt(theta_d)
 
@@ -344,7 +344,7 @@ def suppression(gray, out, theta_d, big_mean, big_var):
 
 
 # this function is the old suppression and currently not used
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def suppression_by_image(gray, out, theta_d):
     sqrt_theta_d = np.sqrt(theta_d)
     mn = np.mean(gray)
@@ -359,7 +359,7 @@ def suppression_by_image(gray, out, theta_d):
     return out
 
 
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def suppression(gray, out, theta_d, big_mean, big_var):
     """
     not working on NUC only!
@@ -377,7 +377,7 @@ def suppression(gray, out, theta_d, big_mean, big_var):
     return out
 
 
-@jit(nopython=True, parallel=True)
+@jit(nopython=True, nogil=True, parallel=True)
 def rebinMax(arr: np.ndarray, factor: tuple) -> np.ndarray:
     # identicle to rebin + max
     rows, cols = arr.shape[:2]
@@ -390,7 +390,7 @@ def rebinMax(arr: np.ndarray, factor: tuple) -> np.ndarray:
     return res
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def get_alpha(com_ages, models_to_update):
     """
     calc coefficient of the paper
@@ -418,7 +418,7 @@ def get_alpha(com_ages, models_to_update):
     return alpha
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def calc_by_thresh(gray, big_means, big_vars, big_ages, theta):
     """
     decide each pixels are foreground by thresholding as in eq (16)
@@ -2,7 +2,7 @@ import cv2
 import numpy as np
 
 from KLTWrapper import KLTWrapper
-from MovingCameraVMD.utiles import get_grid_coordinates, get_prev_centers, overlap, check_overlap
+from MovingCameraVMD.utiles import get_grid_coordinates, get_prev_centers, overlap_batch
 from Grid import Grid
 
 
@@ -12,6 +12,7 @@ class ForegroundPicker:
         self.klt = KLTWrapper()
         self.coords = []
         self.grids = []
+        self.centers = None
 
         self.grid_size = grid_size
         self.theta_d = theta_d
@@ -40,29 +41,28 @@ class ForegroundPicker:
             g = Grid(x0, y0, x1, y1, gray_frame[y0:y1, x0:x1], self.lam, self.theta_d, self.theta_v, self.init_age,
                      self.theta_s)
             self.grids.append(g)
+        self.centers = np.array([grid.center for grid in self.grids], dtype=np.float32)
 
     def compensate(self, prev_centers):
         h_, w_ = self.grid_size // 2, self.grid_size // 2  # self.frame_size[0] // (2*self.grid_size), self.frame_size[1] // (2*self.grid_size)
         for prev_center, now_grid in zip(prev_centers, self.grids):
             x, y, _ = prev_center
             prev_grid_coords = [x - w_ + 1, y - h_ + 1, x + w_, y + h_]
-            overlap_weights = []
+            weights = overlap_batch([prev_grid_coords], self.coords)[0] / self.grid_area   # TODO: fix tiny overlaps #TODO: find out if fixed
+            overlapping = np.flatnonzero(weights)
+            # take the overlapping grids in order until 4 are found or their weights sum to 1, to save time
+            stop = (np.arange(1, len(overlapping) + 1) >= 4) | (np.cumsum(weights[overlapping]) >= 1)
+            if stop.any():
+                overlapping = overlapping[:np.argmax(stop) + 1]
+            overlap_weights = weights[overlapping].tolist()
             overlap_means = []
             overlap_vars = []
             overlap_ages = []
-            count_overlaps = 0
-            for grid in self.grids:
-                if not check_overlap(prev_grid_coords, grid.get_coords()):
-                    continue
-                w = overlap(prev_grid_coords, grid.get_coords()) / self.grid_area   # TODO: fix tiny overlaps #TODO: find out if fixed
-                overlap_weights.append(w)
-                mn, vr, age = grid.get_prev_params()
+            for i in overlapping:
+                mn, vr, age = self.grids[i].get_prev_params()
                 overlap_means.append(mn)
                 overlap_vars.append(vr)
                 overlap_ages.append(age)
-                count_overlaps += 1
-                if count_overlaps >= 4 or sum(overlap_weights) >= 1:  # save time
-                    break
             if len(overlap_weights) < 4:
                 overlap_weights = [w/sum(overlap_weights) for w in overlap_weights]  # normalize so sum is 1
             now_grid.compensate_model(overlap_weights, overlap_means, overlap_vars, overlap_ages)
@@ -96,8 +96,7 @@ class ForegroundPicker:
         for coord, grid in zip(self.coords, self.grids):
             grid.update_values(gray_frame[coord[1]:coord[3], coord[0]:coord[2]])
 
-        centers = [grid.center for grid in self.grids]
-        prev_centers = get_prev_centers(homography, centers)
+        prev_centers = get_prev_centers(homography, self.centers)
         self.compensate(prev_centers)
         self.final_update_grid_models()
         d = self.decide()
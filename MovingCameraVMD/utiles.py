@@ -1,32 +1,26 @@
 import numpy as np
 
 
-def no_overflow(i, addition, limit):
-    if i + addition >= limit:
-        return limit - 1
-    else:
-        return i + addition - 1
-
-
 def get_grid_coordinates(grid_size, img_size):
-    coords = []
-    patch_size_y = grid_size  # img_size[0] // grid_size
-    patch_size_x = grid_size  # img_size[1] // grid_size
-    for y in range(0, img_size[0], patch_size_y):
-        for x in range(0, img_size[1], patch_size_x):
-            x0 = x
-            y0 = y
-            x1 = no_overflow(x, patch_size_x, img_size[1])
-            y1 = no_overflow(y, patch_size_y, img_size[0])
-            coords.append([x0, y0, x1, y1])
-    return coords
+    """
+    :return: (num_grids, 4) array of [x0, y0, x1, y1] for each grid, row by row
+    """
+    ys = np.arange(0, img_size[0], grid_size, dtype=np.int32)
+    xs = np.arange(0, img_size[1], grid_size, dtype=np.int32)
+    x0, y0 = np.meshgrid(xs, ys)
+    x1 = np.minimum(x0 + grid_size, img_size[1]) - 1
+    y1 = np.minimum(y0 + grid_size, img_size[0]) - 1
+    return np.stack([x0, y0, x1, y1], axis=-1).reshape(-1, 4)
 
 
 def get_prev_centers(mat, centers):
-    centers = np.array(centers).T
-    prev_centers_unite = np.matmul(mat, centers)
-    return [prev_center.tolist() for prev_center in prev_centers_unite.T]
-    # return [np.matmul(mat, center) for center in centers]
+    """
+    :param mat: 3x3 homography
+    :param centers: (N, 3) float32 array of homogeneous centers
+    :return: (N, 3) float32 array of the centers multiplied by mat
+    """
+    centers = np.asarray(centers, dtype=np.float32)
+    return centers @ mat.astype(np.float32).T
 
 
 def correct_overlap(i1, i2):
@@ -57,3 +51,32 @@ def rect_area(x1, y1, x2, y2):
     ydiff = abs(y1 - y2) + 1
 
     return xdiff * ydiff
+
+
+def check_overlap_batch(boxes1, boxes2):
+    """
+    :return: (N, M) boolean matrix, true where the boxes overlap as in check_overlap
+    """
+    return overlap_batch(boxes1, boxes2) > 0
+
+
+def overlap_batch(boxes1, boxes2):
+    """
+    overlap between each pair of boxes
+    :param boxes1: (N, 4) array of [x0, y0, x1, y1]
+    :param boxes2: (M, 4) array of [x0, y0, x1, y1]
+    :return: (N, M) matrix of overlapping areas, 0 if the boxes don't intersect
+    """
+    boxes1, boxes2 = np.asarray(boxes1), np.asarray(boxes2)
+    dx = np.minimum(boxes1[:, None, 2] + 1, boxes2[None, :, 2] + 1) - np.maximum(boxes1[:, None, 0], boxes2[None, :, 0])
+    dy = np.minimum(boxes1[:, None, 3] + 1, boxes2[None, :, 3] + 1) - np.maximum(boxes1[:, None, 1], boxes2[None, :, 1])
+    return np.maximum(dx, 0) * np.maximum(dy, 0)
+
+
+def rect_area_batch(boxes):
+    """
+    :param boxes: (N, 4) array of [x0, y0, x1, y1]
+    :return: area of each box
+    """
+    boxes = np.asarray(boxes)
+    return (np.abs(boxes[:, 2] - boxes[:, 0]) + 1) * (np.abs(boxes[:, 3] - boxes[:, 1]) + 1)
@@ -18,11 +18,21 @@ class SimpleThresholdBinarizer(Updatable):
     DEFAULT_ARGS = {'thresh':30,'maxval':255,'type':cv.THRESH_BINARY}
     def __init__(self, **kwargs) -> None:
         self.kwargs = dict(SimpleThresholdBinarizer.DEFAULT_ARGS,**kwargs) # give priority to the inserted arguments
-        
+
+    @property
+    def TILEABLE(self):
+        # the binarization can be computed by row tiles, see VMD.tiled_binary_foreground, unless the threshold is
+        # computed from the histogram of the whole frame
+        return not self.kwargs['type'] & (cv.THRESH_OTSU | cv.THRESH_TRIANGLE)
+
     def __call__(self, gray_frame):
         # thresh_frame = cv.threshold(src=gray_frame, thresh=self.diff_frame_threshold, maxval=255, type=cv.THRESH_BINARY)[1]
         binary_frame = cv.threshold(src=gray_frame, **self.kwargs)[1]
         return binary_frame
+
+    def process_tile(self, tile_in, tile_out):
+        cv.threshold(src=tile_in, dst=tile_out, **self.kwargs)
+        return tile_out
     
 
     def update(self, **kwargs):
@@ -31,6 +41,8 @@ class SimpleThresholdBinarizer(Updatable):
 
 @register("DynamicThresholdBinarizer")
 class DynamicThresholdBinarizer(SimpleThresholdBinarizer):
+    TILEABLE = False  # the threshold depends on the statistics of the whole frame
+
     def __init__(self, **kwargs):
         super(DynamicThresholdBinarizer, self).__init__(**kwargs)
         assert 'thresh' in kwargs.keys(), "The constructor excpects thresh to exist in the parameters to the threhsold function"
@@ -53,6 +65,8 @@ class DynamicThresholdBinarizer(SimpleThresholdBinarizer):
 
 @register("NormalizedBinarizer")
 class NormalizedBinarizer(SimpleThresholdBinarizer):
+    TILEABLE = False  # the normalization depends on the statistics of the whole frame
+
     def __init__(self,**kwargs):
         super(NormalizedBinarizer, self).__init__(**kwargs)
 
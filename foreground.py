@@ -1,10 +1,9 @@
 import numpy as np
 import cv2 as cv
-from skimage.util import view_as_windows
 from VMD.MovingCameraForegroundEstimetor.ForegroundEstimetor import ForegroundEstimetor
 from time import time
+from numpy.lib.stride_tricks import sliding_window_view
 from numba import jit, prange
-from collections import deque
 foreground_estimators = {}
 
 
@@ -20,36 +19,101 @@ def register(name):
 class MovingCameraForegroundEstimetor(ForegroundEstimetor):
     def __init__(self, num_models=2, block_size=4, var_init=20.0 * 20.0, var_trim=5.0 * 5.0, lam=0.001,
                  theta_v=50.0 * 50.0, age_trim=30, theta_s=2, theta_d=2, dynamic=False, calc_probs=False,
-                 sensitivity="mixed", suppress=False, smooth=True):
+                 sensitivity="mixed", suppress=False, smooth=True, static_sad_thresh=0):
         super(MovingCameraForegroundEstimetor, self).__init__(num_models, block_size, var_init, var_trim, lam, theta_v,
                                                               age_trim, theta_s, theta_d, dynamic, calc_probs,
-                                                              sensitivity, suppress, smooth)
+                                                              sensitivity, suppress, smooth, static_sad_thresh)
+
+
+class FramesRingBuffer:
+    """
+    fixed size history of the last frames, preallocated on the first frame and overwritten in place
+    """
+    def __init__(self, num_frames):
+        self.num_frames = num_frames
+        self.frames = None
+        self.index = 0
+        self.filled = 0
+
+    def __len__(self):
+        return self.filled
+
+    def is_full(self):
+        return self.filled == self.num_frames
+
+    def oldest(self):
+        """
+        :return: the frame that the next push evicts, None if the history is not full yet
+        """
+        return self.frames[self.index] if self.is_full() else None
+
+    def push(self, frame):
+        if self.frames is None:
+            self.frames = np.empty((self.num_frames,) + frame.shape, dtype=frame.dtype)
+        self.frames[self.index] = frame
+        self.index = (self.index + 1) % self.num_frames
+        self.filled = min(self.filled + 1, self.num_frames)
 
 
 @register("MedianForegroundEstimation")
 class MedianForegroundEstimation:
+    # the per pixel part of the estimation can be computed by row tiles, see VMD.tiled_binary_foreground
+    TILEABLE = True
+
     def __init__(self, num_frames=10) -> None:
-        self.frames_history = []
+        # like the original list history, once full the median is over the num_frames + 1 previous frames
+        self.window_size = num_frames + 1
+        self.frames_history = FramesRingBuffer(self.window_size)
+        self.sorted_window = None
+        self.background = None
+        self.has_background = False
         self.num_frames = num_frames
 
     def __call__(self, frame):
+        self.prepare(frame)
+        return self.process_tile(frame, slice(None), np.empty_like(frame))
+
+    def prepare(self, frame):
+        """
+        update the frame global state: compute the background from the history, then add the frame to it
+        :param frame: the current frame
+        """
         if len(self.frames_history) == 0:
-            foreground = frame
+            self.sorted_window = np.empty(frame.shape + (self.window_size,), dtype=np.uint8)
+            self.background = np.empty_like(frame)
+            self.has_background = False
 
         else:
-            background = np.median(self.frames_history, axis=0).astype(dtype=np.uint8)
-            foreground = cv.absdiff(frame, background)
-
-            if len(self.frames_history) >= self.num_frames:
-                self.frames_history = list(self.frames_history[-self.num_frames:])
+            window_median(self.sorted_window, len(self.frames_history), self.background)
+            self.has_background = True
 
-        self.frames_history.append(frame)
-        return foreground
+        if self.frames_history.is_full():
+            replace_in_sorted_window(self.sorted_window, len(self.frames_history), self.frames_history.oldest(),
+                                     frame)
+        else:
+            insert_to_sorted_window(self.sorted_window, len(self.frames_history), frame)
+
+        self.frames_history.push(frame)
+
+    def process_tile(self, frame, rows, out):
+        """
+        foreground of some rows of the frame, prepare should be called on the frame first
+        :param frame: the current frame
+        :param rows: slice of the rows to compute
+        :param out: where to store the foreground of the rows
+        :return: out
+        """
+        if not self.has_background:
+            out[:] = frame[rows]
+        else:
+            cv.absdiff(frame[rows], self.background[rows], dst=out)
+        return out
 
     def reset(self):
-        self.frames_history = []
-
-
+        self.frames_history = FramesRingBuffer(self.window_size)
+        self.sorted_window = None
+        self.background = None
+        self.has_background = False
 
 
 @register("MOG2")
@@ -64,69 +128,241 @@ class MOG2():
 
 @register("PESMODForegroundEstimation")
 class PESMODForegroundEstimation():
-    def __init__(self, neighborhood_matrix: tuple = (3, 3), num_frames=10, suppress=False) -> None:
+    # the per pixel part of the estimation can be computed by row tiles, see VMD.tiled_binary_foreground
+    TILEABLE = True
+    # padding value for the background, far enough from any uint8 pixel to never be the minimal difference
+    PAD_VALUE = np.iinfo(np.int16).max
+
+    def __init__(self, neighborhood_matrix: tuple = (3, 3), num_frames=10, suppress=False,
+                 exponential_background=False) -> None:
+        """
+        :param exponential_background: if True the background is an exponential moving average with weight
+        1 / num_frames, which needs no frames history, instead of the mean of the last num_frames frames
+        """
         self.neighborhood_matrix = neighborhood_matrix
-        self.frames_history = deque()
+        self.exponential_background = exponential_background
+        self.frames_history = FramesRingBuffer(num_frames)
+        self.window_sum = None
+        self.background_accumulator = None
+        self.padded_background = None
+        self.suppress_threshold = None
         self.num_frames = num_frames
         self.suppress = suppress
         self.filter_w, self.filter_h = self.neighborhood_matrix
         self.pad_w = int(self.filter_w / 2)
         self.pad_h = int(self.filter_h / 2)
 
-        PESMODForegroundEstimation.compile_difference()
-
-    @staticmethod
-    def compile_difference():
-        temp1 = np.zeros((400, 400, 3, 3), dtype=np.float64)
-        temp2 = np.zeros((3, 3, 400, 400), dtype=np.uint8)
-        difference(temp1, temp2)
-
     def __call__(self, frame):
-        if len(self.frames_history) == 0:
-            self.frames_history.append(frame)
-            self.window_sum = self.frames_history[-1].astype(np.int32)
-            foreground = frame
+        self.prepare(frame)
+        return self.process_tile(frame, slice(None), np.empty_like(frame))
+
+    def prepare(self, frame):
+        """
+        update the frame global state: pad the background of the previous frames, then add the frame to it
+        :param frame: the current frame
+        """
+        if self.exponential_background:
+            background = self.update_exponential_background(frame)
         else:
-            background = self.window_sum / len(self.frames_history)
-            padded_background = np.pad(background, ((self.pad_w, self.pad_w), (self.pad_h, self.pad_h)),
-                                       constant_values=(np.inf, np.inf))
-            background_patches = view_as_windows(padded_background, self.neighborhood_matrix)
-
-            w, h = frame.shape
+            background = self.update_window_background(frame)
 
-            broadcasted_frame = np.broadcast_to(frame, (self.filter_w, self.filter_h, w, h))
+        if background is None:
+            self.padded_background = None
+            return
 
-            foreground = difference(background_patches, broadcasted_frame)
+        self.padded_background = cv.copyMakeBorder(background, self.pad_w, self.pad_w, self.pad_h, self.pad_h,
+                                                   cv.BORDER_CONSTANT, value=int(self.PAD_VALUE))
 
-            if self.suppress:
-                mn = np.mean(frame)
-                std = np.std(frame)
-                foreground[frame < mn + std] = 0
+        if self.suppress:
+            self.suppress_threshold = np.mean(frame) + np.std(frame)
 
-            self.frames_history.append(frame)
-
-            if len(self.frames_history) > self.num_frames:
-                self.window_sum -= self.frames_history[0]
-                self.frames_history.popleft()
-
-            self.window_sum += self.frames_history[-1]
-        return foreground
+    def update_window_background(self, frame):
+        """
+        :param frame: the current frame
+        :return: int16 mean of the last num_frames frames before the frame, None for the first frame
+        """
+        if len(self.frames_history) == 0:
+            self.frames_history.push(frame)
+            self.window_sum = frame.astype(np.int32)
+            return None
+
+        background = np.empty(frame.shape, dtype=np.int16)
+        n = len(self.frames_history)
+        if n & (n - 1) == 0:  # power of two, divide by shifting
+            np.right_shift(self.window_sum, n.bit_length() - 1, out=background, casting='unsafe')
+        else:
+            np.floor_divide(self.window_sum, n, out=background, casting='unsafe')
+
+        if self.frames_history.is_full():
+            self.window_sum -= self.frames_history.oldest()
+        self.frames_history.push(frame)
+        self.window_sum += frame
+        return background
+
+    def update_exponential_background(self, frame):
+        """
+        :param frame: the current frame
+        :return: int16 exponential moving average of the frames before the frame, None for the first frame
+        """
+        if self.background_accumulator is None:
+            self.background_accumulator = frame.astype(np.float32)
+            return None
+
+        background = np.empty(frame.shape, dtype=np.int16)
+        np.copyto(background, self.background_accumulator, casting='unsafe')
+        cv.accumulateWeighted(frame, self.background_accumulator, 1.0 / self.num_frames)
+        return background
+
+    def process_tile(self, frame, rows, out):
+        """
+        foreground of some rows of the frame, prepare should be called on the frame first
+        :param frame: the current frame
+        :param rows: slice of the rows to compute
+        :param out: where to store the foreground of the rows
+        :return: out
+        """
+        if self.padded_background is None:
+            out[:] = frame[rows]
+            return out
+
+        start, stop, _ = rows.indices(frame.shape[0])
+        frame_rows = frame[start:stop]
+        self.neighborhood_difference(self.padded_background[start:stop + 2 * self.pad_w], frame_rows, out)
+
+        if self.suppress:
+            out[frame_rows < self.suppress_threshold] = 0
+        return out
+
+    def neighborhood_difference(self, padded_background, frame, out):
+        """
+        minimal absolute difference between each pixel and the background pixels in its neighborhood
+        :param padded_background: int16 background padded by PAD_VALUE
+        :param frame: the current frame
+        :param out: where to store the uint8 foreground
+        :return: out
+        """
+        if tuple(self.neighborhood_matrix) == (3, 3):
+            return difference(padded_background, frame, out)
+
+        # general neighborhoods, a strided view of the background windows of each pixel, nothing is copied
+        background_windows = sliding_window_view(padded_background, (self.filter_w, self.filter_h), writeable=True)
+        return window_difference(background_windows, frame, out)
 
     def reset(self):
-        self.frames_history = deque()
-
-
-@jit(nopython=True, parallel=True)
-def difference(background_patches, broadcasted_frame):
-    h, w = broadcasted_frame.shape[2], broadcasted_frame.shape[3]
-
-    frame = np.transpose(broadcasted_frame, (2, 3, 0, 1))
-
-    foreground = np.empty((h, w), dtype=np.uint8)
-
-    for i in prange(h):
-        for j in prange(w):
-            diff = np.abs(np.subtract(background_patches[i, j], frame[i, j]))
-            min_diff = np.min(diff)
-            foreground[i, j] = min_diff
-    return foreground
+        self.frames_history = FramesRingBuffer(self.num_frames)
+        self.window_sum = None
+        self.background_accumulator = None
+        self.padded_background = None
+
+
+# compiled eagerly at import for the only types it is called with, int16 padded background and uint8 frames
+@jit('u1[:, :](i2[:, :], u1[:, :], u1[:, :])', nopython=True, nogil=True, parallel=True, fastmath=True,
+     boundscheck=False, cache=True)
+def difference(padded_background, frame, out):
+    """
+    minimal absolute difference between each pixel and the background pixels in its 3x3 neighborhood
+    :param padded_background: background padded by one pixel on each side
+    :param frame: the current frame
+    :param out: where to store the foreground
+    """
+    rows, cols = frame.shape
+    bg = padded_background
+    for y in prange(rows):
+        for x in range(cols):
+            f = np.int32(frame[y, x])
+            m = 255
+            m = min(m, abs(np.int32(bg[y, x]) - f))
+            m = min(m, abs(np.int32(bg[y, x + 1]) - f))
+            m = min(m, abs(np.int32(bg[y, x + 2]) - f))
+            m = min(m, abs(np.int32(bg[y + 1, x]) - f))
+            m = min(m, abs(np.int32(bg[y + 1, x + 1]) - f))
+            m = min(m, abs(np.int32(bg[y + 1, x + 2]) - f))
+            m = min(m, abs(np.int32(bg[y + 2, x]) - f))
+            m = min(m, abs(np.int32(bg[y + 2, x + 1]) - f))
+            m = min(m, abs(np.int32(bg[y + 2, x + 2]) - f))
+            out[y, x] = m
+    return out
+
+
+@jit('u1[:, :](i2[:, :, :, :], u1[:, :], u1[:, :])', nopython=True, nogil=True, parallel=True, fastmath=True,
+     boundscheck=False, cache=True)
+def window_difference(background_windows, frame, out):
+    """
+    minimal absolute difference between each pixel and the background pixels in its neighborhood
+    :param background_windows: (rows, cols, filter_w, filter_h) view of the padded background windows
+    :param frame: the current frame
+    :param out: where to store the foreground
+    """
+    rows, cols = frame.shape
+    filter_w, filter_h = background_windows.shape[2], background_windows.shape[3]
+    for y in prange(rows):
+        for x in range(cols):
+            f = np.int32(frame[y, x])
+            m = 255
+            for dy in range(filter_w):
+                for dx in range(filter_h):
+                    m = min(m, abs(np.int32(background_windows[y, x, dy, dx]) - f))
+            out[y, x] = m
+    return out
+
+
+@jit(nopython=True, nogil=True, parallel=True)
+def insert_to_sorted_window(sorted_window, count, frame):
+    """
+    insert each pixel of the frame to its sorted history of values
+    :param sorted_window: (rows, cols, num_frames) per pixel history, the first count entries are sorted
+    :param count: number of valid entries in the window
+    :param frame: the new frame
+    """
+    rows, cols = frame.shape
+    for i in prange(rows):
+        for j in range(cols):
+            window = sorted_window[i, j]
+            value = frame[i, j]
+            k = count
+            while k > 0 and window[k - 1] > value:
+                window[k] = window[k - 1]
+                k -= 1
+            window[k] = value
+
+
+@jit(nopython=True, nogil=True, parallel=True)
+def replace_in_sorted_window(sorted_window, count, old_frame, frame):
+    """
+    replace each pixel of the evicted frame by the pixel of the new frame, keeping the window sorted
+    :param sorted_window: (rows, cols, num_frames) per pixel history, the first count entries are sorted
+    :param count: number of valid entries in the window
+    :param old_frame: the evicted frame
+    :param frame: the new frame
+    """
+    rows, cols = frame.shape
+    for i in prange(rows):
+        for j in range(cols):
+            window = sorted_window[i, j]
+            value = frame[i, j]
+            k = 0
+            while window[k] != old_frame[i, j]:
+                k += 1
+            while k > 0 and window[k - 1] > value:
+                window[k] = window[k - 1]
+                k -= 1
+            while k < count - 1 and window[k + 1] < value:
+                window[k] = window[k + 1]
+                k += 1
+            window[k] = value
+
+
+@jit(nopython=True, nogil=True, parallel=True)
+def window_median(sorted_window, count, out):
+    """
+    median of each pixel history, same as np.median(...).astype(np.uint8)
+    :param sorted_window: (rows, cols, num_frames) per pixel history, the first count entries are sorted
+    :param count: number of valid entries in the window
+    :param out: where to store the median
+    """
+    rows, cols = out.shape
+    low, high = (count - 1) // 2, count // 2
+    for i in prange(rows):
+        for j in range(cols):
+            out[i, j] = (np.uint16(sorted_window[i, j, low]) + np.uint16(sorted_window[i, j, high])) // 2
+    return out
@@ -10,11 +10,19 @@ from VMD.morphologies import morphologies
 from SoiUtils.load import load_yaml
 from SoiUtils.interfaces import Resetable, Updatable, Localizer
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 class VMD(Resetable,Updatable,Localizer):
-
-    def __init__(self, stabilizer, binarizer, detector, foreground_estimator,morphology) -> None:
+    # how the bgr frames are reduced to a single channel:
+    # 'bt601' - weighted luma (cv.cvtColor), 'green' - the green channel only,
+    # 'gray' - the frames are already single channel, e.g. the Y plane of a capture with CAP_PROP_CONVERT_RGB=0
+    GRAY_MODES = ('bt601', 'green', 'gray')
+    # the gray frames are written to alternating buffers since the stages may keep the previous frame
+    NUM_GRAY_BUFFERS = 2
+
+    def __init__(self, stabilizer, binarizer, detector, foreground_estimator,morphology, gray_mode='bt601',
+                 tile_rows=None, pipelined=False) -> None:
         logging.basicConfig(level=logging.DEBUG)
         self.video_stabilization_obj = stabilizers[stabilizer['stabilizer_name']](
             **stabilizer.get('stabilizer_params', {}))
@@ -26,7 +34,23 @@ class VMD(Resetable,Updatable,Localizer):
             foreground_estimator['foreground_estimator_name']](
             **foreground_estimator.get('foreground_estimator_params', {}))
         self.morphology_obj = morphologies[morphology['morphology_name']](**morphology.get('morphology_params',{}))
-        
+        if gray_mode not in VMD.GRAY_MODES:
+            raise ValueError(f"gray_mode should be one of {VMD.GRAY_MODES}, got {gray_mode}")
+        self.gray_mode = gray_mode
+        self.gray_buffers = None
+        self.gray_index = 0
+        # when both stages are per pixel, the foreground is estimated and binarized tile by tile so the full
+        # foreground frame is never written, e.g. tile_rows=64, None disables it
+        self.tile_rows = tile_rows
+        self.foreground_tile = None
+        # when pipelined, the stabilization of a frame runs while the previous frame is detected in a worker thread,
+        # and each call returns the bboxes of the previous frame, see flush for the bboxes of the last one and close
+        self.pipelined = pipelined
+        self.detection_executor = ThreadPoolExecutor(max_workers=1) if pipelined else None
+        self.pending_detection = None
+        # the worker may still use the previous gray frame while its own previous frame is kept by the stages
+        self.num_gray_buffers = VMD.NUM_GRAY_BUFFERS + int(pipelined)
+
         self.frame_counter = 0
         self.time = 0
 
@@ -35,20 +59,112 @@ class VMD(Resetable,Updatable,Localizer):
         vmd_params = load_yaml(yaml_config_path)
         return cls(**vmd_params)
 
-    def __call__(self, frame):
+    def to_gray(self, frame):
         # the cv2 caption reads all frames defaultly as bgr therefore they are converted to gray.
-        frame = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+        if self.gray_mode == 'gray':
+            if frame.ndim != 2:
+                raise ValueError(f"gray_mode 'gray' expects single channel frames, got a frame of shape {frame.shape}")
+            # when pipelined the worker may still use the frame after the call returns and the caller reuses its buffer
+            if not self.pipelined:
+                return frame
+
+        if self.gray_buffers is None or self.gray_buffers[0].shape != frame.shape[:2]:
+            self.gray_buffers = [np.empty(frame.shape[:2], dtype=frame.dtype) for _ in range(self.num_gray_buffers)]
+        gray = self.gray_buffers[self.gray_index]
+        self.gray_index = (self.gray_index + 1) % self.num_gray_buffers
+
+        if self.gray_mode == 'gray':
+            np.copyto(gray, frame)
+        elif self.gray_mode == 'green':
+            cv.extractChannel(frame, 1, dst=gray)
+        else:
+            cv.cvtColor(frame, cv.COLOR_BGR2GRAY, dst=gray)
+        return gray
+
+    def __call__(self, frame):
+        frame = self.to_gray(frame)
 
         stabilized_frame = self.video_stabilization_obj(frame)
-        foreground_estimation = self.foreground_estimation_obj(stabilized_frame)
-        binary_foreground_estimation = self.binary_frame_creator_obj(foreground_estimation)
-        morphed_frame = self.morphology_obj(binary_foreground_estimation)
-        frame_bboxes = self.bbox_creator_obj(morphed_frame)
+        if self.pipelined:
+            frame_bboxes = self.flush()
+            self.pending_detection = self.detection_executor.submit(self.detect, stabilized_frame)
+        else:
+            frame_bboxes = self.detect(stabilized_frame)
         logging.debug(f'frame number {self.frame_counter}')
         self.frame_counter += 1
         return frame_bboxes
 
+    def detect(self, stabilized_frame):
+        if self.can_fuse_tiles():
+            binary_foreground_estimation = self.tiled_binary_foreground(stabilized_frame)
+        else:
+            foreground_estimation = self.foreground_estimation_obj(stabilized_frame)
+            binary_foreground_estimation = self.binary_frame_creator_obj(foreground_estimation)
+        morphed_frame = self.morphology_obj(binary_foreground_estimation)
+        return self.bbox_creator_obj(morphed_frame)
+
+    def flush(self):
+        """
+        wait for the detection in progress when pipelined, see close for stopping the worker thread
+        :return: the bboxes of the last frame given to the pipeline, an empty dataframe if there is none
+        """
+        if self.pending_detection is None:
+            return pd.DataFrame()
+        # cleared first so a failed detection raises once and does not fail the following calls
+        pending_detection, self.pending_detection = self.pending_detection, None
+        return pending_detection.result()
+
+    def drop_pending_detection(self):
+        """
+        wait for the detection in progress when pipelined and discard its bboxes, or its error if it failed
+        """
+        if self.pending_detection is not None:
+            self.pending_detection.exception()
+            self.pending_detection = None
+
+    def close(self):
+        """
+        flush and stop the worker thread when pipelined, the instance should not be called afterwards
+        :return: the bboxes of the last frame given to the pipeline, see flush
+        """
+        try:
+            return self.flush()
+        finally:
+            if self.detection_executor is not None:
+                self.detection_executor.shutdown()
+                self.detection_executor = None
+
+    def __del__(self):
+        if getattr(self, 'detection_executor', None) is not None:
+            self.detection_executor.shutdown(wait=False)
+
+    def can_fuse_tiles(self):
+        return bool(self.tile_rows) and getattr(self.foreground_estimation_obj, 'TILEABLE', False) and \
+            getattr(self.binary_frame_creator_obj, 'TILEABLE', False)
+
+    def tiled_binary_foreground(self, frame):
+        """
+        estimate the foreground and binarize it by tiles of rows, the frame global state of the foreground estimator
+        is updated once before the tiles and the morphology and detection run on the whole binary map
+        :param frame: the stabilized frame
+        :return: binary foreground estimation
+        """
+        self.foreground_estimation_obj.prepare(frame)
+
+        rows, cols = frame.shape
+        if self.foreground_tile is None or self.foreground_tile.shape != (self.tile_rows, cols):
+            self.foreground_tile = np.empty((self.tile_rows, cols), dtype=np.uint8)
+        binary_foreground_estimation = np.empty((rows, cols), dtype=np.uint8)
+
+        for start in range(0, rows, self.tile_rows):
+            tile_rows = slice(start, min(start + self.tile_rows, rows))
+            foreground_tile = self.foreground_tile[:tile_rows.stop - start]
+            self.foreground_estimation_obj.process_tile(frame, tile_rows, foreground_tile)
+            self.binary_frame_creator_obj.process_tile(foreground_tile, binary_foreground_estimation[tile_rows])
+        return binary_foreground_estimation
+
     def reset(self):
+        self.drop_pending_detection()
         self.time = 0
         if issubclass(type(self.video_stabilization_obj), Resetable):
             self.video_stabilization_obj.reset()
@@ -66,6 +182,7 @@ class VMD(Resetable,Updatable,Localizer):
             self.morphology_obj.reset()
 
     def update(self, stabilizer, binarizer, detector, foreground_estimator,morphology):
+        self.drop_pending_detection()
         self.time = 0
         if issubclass(type(self.video_stabilization_obj), Updatable):
             self.video_stabilization_obj.update(**stabilizer.get('stabilizer_params', {}))